@@ -1,144 +1,383 @@
 import os
+import asyncio
+import contextlib
+import httpx
+from aiolimiter import AsyncLimiter
 import requests
-# BeautifulSoup is no longer strictly needed in fetch_report_links if we only use the regex,
-# but it doesn't hurt to keep it for now if the <a> tag scan is ever re-enabled or useful.
-from bs4 import BeautifulSoup 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
-import time
-import json # To pretty-print JSON if needed, and for the AI script later
+import logging
+import zstandard as zstd
+import json # Only used to validate downloaded bodies (when enabled) and for the HTTP cache sidecar
 
-# Define a User-Agent to mimic a browser
+# Only advertise Brotli when it can be decoded: requests/urllib3 and httpx decode "br" transparently
+# if the brotli package is importable, otherwise the raw compressed bytes would end up in the archive.
+try:
+    import brotli # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] %(message)s')
+# httpx logs every request at INFO; keep per-request chatter out of the run log
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Define a User-Agent to mimic a browser, and ask for compressed bodies
 HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Encoding': ACCEPT_ENCODING,
 }
 # Increased timeout
 REQUEST_TIMEOUT = 30 # seconds
+# Upper bound on simultaneous game JSON downloads
+MAX_CONCURRENT_DOWNLOADS = 8
+# Average request rate to official.nba.com, enforced by a token bucket: short bursts can fill the
+# connection pool, but there are no idle waits between fast responses like the old fixed sleep had
+MAX_REQUESTS_PER_SECOND = 8
+# Reports are archived byte-for-byte as served. Set to True to parse each body once before saving,
+# which rejects non-JSON responses (e.g. an HTML error page served with a 200) at the cost of a full parse.
+VALIDATE_JSON = False
+# Downloads are streamed to disk: read the body in 64 KB pieces into a 1 MB buffered writer,
+# so a whole report is normally flushed with a single write() syscall
+STREAM_CHUNK_SIZE = 64 * 1024
+WRITE_BUFFER_SIZE = 1 << 20
+
+# The JSON URL pattern observed in the L2MReport.html's JavaScript
+L2M_JSON_URL = "https://official.nba.com/l2m/json/{game_id}.json"
+# Sidecar file (inside the output directory) remembering ETag / Last-Modified per URL for conditional GETs
+HTTP_CACHE_FILENAME = ".http_cache" # No .json suffix, so report scans never mistake it for a game
+# Reports are write-once archives, so they are stored zstd-compressed as {game_id}.json.zst
+# (JSON typically shrinks 5-10x at level 3). Set to False to store plain {game_id}.json files.
+COMPRESS_ARCHIVE = True
+ZSTD_LEVEL = 3
+REPORT_SUFFIX = ".json.zst" if COMPRESS_ARCHIVE else ".json"
+
+# gameId in L2MReport.html links; matched directly against the raw page bytes, no HTML parse needed
+_GAMEID_RE = re.compile(rb"L2MReport\.html\?gameId=(\d{10})")
+
+# Transient failures are retried inside the HTTP clients with exponential backoff
+# (0.5 s, 1 s, 2 s, ...) rather than failing the game and forcing a manual re-run
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.5 # seconds
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# One shared session for every request so the connection to official.nba.com is kept alive
+# and reused across all game JSON downloads instead of paying a new TCP + TLS handshake each time.
+_SESSION = requests.Session()
+_SESSION.headers.update(HEADERS)
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=MAX_RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+    ),
+))
+
+def _load_http_cache(output_dir: str) -> dict:
+    """
+    Load the url -> {"etag", "last_modified", ...} map saved by a previous run (empty if none).
+    """
+    try:
+        with open(os.path.join(output_dir, HTTP_CACHE_FILENAME), "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_http_cache(output_dir: str, http_cache: dict):
+    cache_path = os.path.join(output_dir, HTTP_CACHE_FILENAME)
+    try:
+        with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(http_cache, f, separators=(",", ":"), ensure_ascii=False)
+        os.replace(cache_path + ".tmp", cache_path)
+    except IOError as io_err:
+        logging.error(f"[save_raw_json_reports] Error saving HTTP cache file: {io_err}")
 
-def fetch_game_ids_from_index(index_url: str) -> list[str]:
+def _conditional_headers(cache_entry: dict | None) -> dict:
+    """
+    Build If-None-Match / If-Modified-Since headers from a cached entry.
+    """
+    headers = {}
+    if cache_entry:
+        if cache_entry.get("etag"):
+            headers["If-None-Match"] = cache_entry["etag"]
+        if cache_entry.get("last_modified"):
+            headers["If-Modified-Since"] = cache_entry["last_modified"]
+    return headers
+
+def _validators_from(response_headers) -> dict:
+    """
+    Extract the ETag / Last-Modified validators from a 200 response, for storing in the HTTP cache.
+    """
+    return {
+        "etag": response_headers.get("ETag"),
+        "last_modified": response_headers.get("Last-Modified"),
+    }
+
+def fetch_game_ids_from_index(index_url: str, http_cache: dict | None = None) -> list[str]:
     """
     Scrape all L2M report game_ids from the given index URL.
-    This function primarily looks for gameId patterns in hrefs.
+    The raw page bytes are scanned for "L2MReport.html?gameId=..." links, so IDs are found anywhere
+    in the page (hrefs, inline scripts, ...), not only in <a> tags.
+    If http_cache is given, the page is requested conditionally and the cached game_ids
+    are returned when the server answers 304 Not Modified; the cache is updated on 200.
     """
-    print(f"[fetch_game_ids_from_index] Attempting to fetch game IDs from: {index_url}")
+    logging.debug(f"[fetch_game_ids_from_index] Attempting to fetch game IDs from: {index_url}")
     game_ids = set()
+    cache_entry = http_cache.get(index_url) if http_cache is not None else None
+    if cache_entry and not isinstance(cache_entry.get("game_ids"), list):
+        cache_entry = None
     try:
-        resp = requests.get(index_url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
+        resp = _SESSION.get(index_url, headers=_conditional_headers(cache_entry), timeout=REQUEST_TIMEOUT)
+        if resp.status_code == 304 and cache_entry:
+            logging.info(f"[fetch_game_ids_from_index] {index_url} not modified since last run; using {len(cache_entry['game_ids'])} cached game ID(s).")
+            return sorted(cache_entry["game_ids"])
         resp.raise_for_status()
-        print(f"[fetch_game_ids_from_index] Successfully fetched {index_url}, status: {resp.status_code}")
-
-        # Using BeautifulSoup to parse the page and find all links
-        soup = BeautifulSoup(resp.text, "html.parser")
-        links_found_matching_pattern = 0
-        total_links_inspected = 0
-
-        for a_tag in soup.find_all("a", href=True):
-            href = a_tag["href"]
-            total_links_inspected += 1
-            
-            # Regex to find gameId in L2MReport.html links
-            match = re.search(r"L2MReport\.html\?gameId=(\d{10})", href)
-            if match:
-                game_id = match.group(1) 
-                game_ids.add(game_id)
-                links_found_matching_pattern += 1
-        
-        print(f"[fetch_game_ids_from_index] Inspected {total_links_inspected} <a> tags with hrefs on {index_url}.")
-
-        if links_found_matching_pattern == 0:
-            print(f"[fetch_game_ids_from_index] No game IDs matching pattern r'L2MReport\\.html\\?gameId=(\\d{{10}})' found on {index_url} via <a> tag scan.")
-            # You could add a raw HTML regex fallback here if needed, similar to your other script,
-            # but the <a> tag scan with the current regex should be effective for the main L2M page.
+        logging.debug(f"[fetch_game_ids_from_index] Successfully fetched {index_url}, status: {resp.status_code}, encoding: {resp.headers.get('Content-Encoding', 'identity')}")
+
+        # Scan the raw bytes for L2MReport links (skips decoding the page and building a parse tree)
+        game_ids = set(m.group(1).decode() for m in _GAMEID_RE.finditer(resp.content))
+
+        if not game_ids:
+            logging.warning(f"[fetch_game_ids_from_index] No game IDs matching pattern r'{_GAMEID_RE.pattern.decode()}' found on {index_url}.")
         else:
-            print(f"[fetch_game_ids_from_index] Found {links_found_matching_pattern} unique game ID(s) on {index_url} via <a> tag scan.")
+            logging.info(f"[fetch_game_ids_from_index] Found {len(game_ids)} unique game ID(s) on {index_url}.")
+            if http_cache is not None:
+                http_cache[index_url] = {**_validators_from(resp.headers), "game_ids": sorted(game_ids)}
 
     except requests.exceptions.RequestException as e:
-        print(f"[fetch_game_ids_from_index] Error fetching {index_url}: {e}")
+        logging.error(f"[fetch_game_ids_from_index] Error fetching {index_url}: {e}")
     except Exception as e:
-        print(f"[fetch_game_ids_from_index] An unexpected error occurred: {e}")
+        logging.error(f"[fetch_game_ids_from_index] An unexpected error occurred: {e}")
 
     return sorted(list(game_ids))
 
-def fetch_l2m_json_data(game_id: str) -> dict | None:
-    """
-    Fetch the L2M JSON data for a given game_id.
-    """
-    # Construct the JSON URL based on the pattern observed in the L2MReport.html's JavaScript
-    json_url = f"https://official.nba.com/l2m/json/{game_id}.json"
-    print(f"[fetch_l2m_json_data] Fetching JSON for game ID: {game_id} from {json_url}")
-    try:
-        resp = requests.get(json_url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
-        resp.raise_for_status()
-        # The response should be JSON, so we parse it directly
-        data = resp.json()
-        print(f"[fetch_l2m_json_data] Successfully fetched and parsed JSON for game ID: {game_id}")
-        return data
-    except requests.exceptions.HTTPError as http_err:
-        print(f"[fetch_l2m_json_data] HTTP error for game ID {game_id} ({json_url}): {http_err}")
-    except requests.exceptions.JSONDecodeError as json_err:
-        print(f"[fetch_l2m_json_data] Error decoding JSON for game ID {game_id} ({json_url}): {json_err}")
-    except requests.exceptions.RequestException as e:
-        print(f"[fetch_l2m_json_data] Error fetching JSON for game ID {game_id} ({json_url}): {e}")
-    return None
-
-def save_raw_json_reports(output_dir: str, test_mode_limit: int = 0):
+def save_raw_json_reports(output_dir: str, test_mode_limit: int = 0, refresh: bool = False):
     """
     Fetch L2M JSON data for each game ID and save it to the given directory.
     If test_mode_limit is > 0, only that many reports will be processed.
+    If refresh is True, reports already on disk are revalidated with conditional GETs
+    (and re-saved only if the server has a newer version) instead of being skipped.
     """
     # Directly fetch game IDs from the current‑season index; archive handling will be added later.
     os.makedirs(output_dir, exist_ok=True)
-    print(f"[save_raw_json_reports] Output directory: '{os.path.abspath(output_dir)}'")
+    logging.info(f"[save_raw_json_reports] Output directory: '{os.path.abspath(output_dir)}'")
+    _sweep_stale_tmp_files(output_dir)
 
     # add archive_seasons later on
     current_season_url = "https://official.nba.com/2024-25-nba-officiating-last-two-minute-reports/"
-    all_game_ids = fetch_game_ids_from_index(current_season_url)
+    http_cache = _load_http_cache(output_dir)
+    all_game_ids = fetch_game_ids_from_index(current_season_url, http_cache)
 
     if not all_game_ids:
-        print("[save_raw_json_reports] No game IDs found. Exiting.")
+        logging.warning("[save_raw_json_reports] No game IDs found. Exiting.")
+        _save_http_cache(output_dir, http_cache)
         return
 
     ids_to_process = all_game_ids
     if test_mode_limit > 0 and test_mode_limit < len(all_game_ids):
-        print(f"[save_raw_json_reports] TEST MODE: Processing up to {test_mode_limit} reports.")
+        logging.info(f"[save_raw_json_reports] TEST MODE: Processing up to {test_mode_limit} reports.")
         ids_to_process = all_game_ids[:test_mode_limit]
     
     if not ids_to_process:
-        print("[save_raw_json_reports] No reports to process (after applying limit). Exiting.")
+        logging.info("[save_raw_json_reports] No reports to process (after applying limit). Exiting.")
+        _save_http_cache(output_dir, http_cache)
         return
 
-    print(f"[save_raw_json_reports] Found {len(all_game_ids)} total unique L2M game IDs. Processing {len(ids_to_process)} JSON reports.")
-    saved_count = 0
-    for i, game_id in enumerate(ids_to_process):
-        print(f"[save_raw_json_reports] Processing report {i+1}/{len(ids_to_process)}: Game ID {game_id}")
-        
-        # Define path for the JSON file
-        json_file_path = os.path.join(output_dir, f"{game_id}.json")
-
-        # Optional: Check if JSON file already exists
-        if os.path.exists(json_file_path):
-            print(f"[save_raw_json_reports]   → {game_id}.json already exists; skipping download.")
-            # If you want to count it as "saved" or "processed" for the test limit, adjust logic here.
-            # For now, it just skips. If you want it to count towards the limit, you might
-            # increment saved_count or ensure it's part of the initial ids_to_process.
-            continue
-
-        json_data = fetch_l2m_json_data(game_id)
-        
-        if json_data:
-            try:
-                with open(json_file_path, "w", encoding="utf-8") as f:
-                    json.dump(json_data, f, indent=4) # Save pretty-printed JSON
-                print(f"[save_raw_json_reports]   → Saved raw JSON report for {game_id} to {json_file_path}")
-                saved_count += 1
-            except IOError as io_err:
-                print(f"[save_raw_json_reports]   Error saving JSON file for {game_id}: {io_err}")
+    # Check which reports are already on disk with one directory scan instead of a stat() per game
+    existing_ids = _existing_game_ids(output_dir)
+    already_saved = [gid for gid in ids_to_process if gid in existing_ids]
+    if already_saved and not refresh:
+        logging.info(f"[save_raw_json_reports] {len(already_saved)} report(s) already exist; skipping download for those.")
+        ids_to_process = [gid for gid in ids_to_process if gid not in existing_ids]
+
+    if not ids_to_process:
+        logging.info("[save_raw_json_reports] All reports already downloaded. Exiting.")
+        _save_http_cache(output_dir, http_cache)
+        return
+
+    logging.info(f"[save_raw_json_reports] Found {len(all_game_ids)} total unique L2M game IDs. Processing {len(ids_to_process)} JSON reports.")
+    saved_count = asyncio.run(_run(ids_to_process, output_dir, http_cache, existing_ids))
+    _save_http_cache(output_dir, http_cache)
+
+    logging.info(f"[save_raw_json_reports] Finished. Successfully saved {saved_count}/{len(ids_to_process)} JSON reports in this run.")
+
+def _sweep_stale_tmp_files(output_dir: str):
+    """
+    Delete *.tmp files left behind by a run that was killed mid-download.
+    Reports are only renamed into place once complete, so these are never valid data.
+    """
+    with os.scandir(output_dir) as entries:
+        stale = [e.path for e in entries if e.name.endswith(".tmp") and e.is_file()]
+    for path in stale:
+        _remove_partial(path)
+    if stale:
+        logging.info(f"[save_raw_json_reports] Removed {len(stale)} stale temp file(s) from an interrupted run.")
+
+def _existing_game_ids(output_dir: str) -> set[str]:
+    """
+    Game IDs that already have a saved report in output_dir (compressed or plain), from a single os.scandir pass.
+    Dotfiles (e.g. the HTTP cache sidecar) are never reports.
+    """
+    with os.scandir(output_dir) as entries:
+        return {
+            e.name.split(".", 1)[0] for e in entries
+            if e.name.endswith((".json", ".json.zst")) and not e.name.startswith(".") and e.is_file()
+        }
+
+def _validate_json_file(json_file_path: str):
+    with open(json_file_path, "rb") as f:
+        if COMPRESS_ARCHIVE:
+            with zstd.ZstdDecompressor().stream_reader(f) as reader:
+                json.load(reader)
         else:
-            print(f"[save_raw_json_reports]   Skipping save for {game_id} due to fetch error or empty JSON data.")
-        
-        if i < len(ids_to_process) - 1:
-            time.sleep(0.5) 
+            json.load(f)
+
+def _open_report_writer(tmp_path: str):
+    """
+    Open the temp file for a report, wrapped in a zstd stream writer when COMPRESS_ARCHIVE is set.
+    Each report gets its own compressor: a ZstdCompressor can't drive several streams at once,
+    and many downloads are in flight concurrently. Closing the returned writer closes the file.
+    """
+    f = open(tmp_path, "wb", buffering=WRITE_BUFFER_SIZE)
+    if COMPRESS_ARCHIVE:
+        return zstd.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(f, closefd=True)
+    return f
+
+def _remove_partial(json_file_path: str):
+    try:
+        os.remove(json_file_path)
+    except FileNotFoundError:
+        pass
+
+def _finish_write(f, tmp_path: str, json_file_path: str, superseded_path: str | None = None):
+    """
+    Flush and close the temp file, then move it into place. Runs in a worker thread.
+    No fsync: the archive is idempotent (a re-run re-downloads anything missing), and forcing
+    a flush per report would stall every other in-flight write. os.replace keeps the swap atomic.
+    superseded_path (an older copy of the same report in the other format) is removed afterwards.
+    """
+    f.close()
+    if VALIDATE_JSON:
+        _validate_json_file(tmp_path)
+    os.replace(tmp_path, json_file_path)
+    if superseded_path:
+        _remove_partial(superseded_path)
 
-    print(f"[save_raw_json_reports] Finished. Successfully saved {saved_count}/{len(ids_to_process)} JSON reports in this run.")
+def _retry_delay(resp: httpx.Response, attempt: int) -> float:
+    """
+    Seconds to wait before retrying resp: the server's Retry-After if it sent one in seconds,
+    otherwise exponential backoff (RETRY_BACKOFF, 2x, 4x, ...), matching the requests session.
+    """
+    retry_after = resp.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return RETRY_BACKOFF * (2 ** attempt)
+
+async def _send_with_retry(client: httpx.AsyncClient, limiter: AsyncLimiter, request: httpx.Request) -> httpx.Response:
+    """
+    Send a streaming request, retrying RETRY_STATUSES up to MAX_RETRIES times.
+    Every attempt (retries included) takes a token from limiter first.
+    Connection failures are retried by the client's transport. The caller must close the response.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        async with limiter:
+            resp = await client.send(request, stream=True)
+        if resp.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            return resp
+        await resp.aclose()
+        await asyncio.sleep(_retry_delay(resp, attempt))
+
+async def _fetch_one(client: httpx.AsyncClient, sem: asyncio.Semaphore, limiter: AsyncLimiter, game_id: str, out_dir: str, http_cache: dict, existing_ids: set[str]) -> bool:
+    """
+    Download one game's L2M JSON and save it to out_dir. Returns True if the report was saved.
+    The body is streamed into a temp file in STREAM_CHUNK_SIZE pieces and renamed into place
+    once complete; blocking file operations run in worker threads to keep the event loop free.
+    If the file is already on disk and http_cache has validators for it, the request is
+    conditional and a 304 Not Modified leaves the existing file untouched.
+    """
+    json_url = L2M_JSON_URL.format(game_id=game_id)
+    json_file_path = os.path.join(out_dir, f"{game_id}{REPORT_SUFFIX}")
+    tmp_path = json_file_path + ".tmp"
+    other_suffix = ".json" if COMPRESS_ARCHIVE else ".json.zst"
+    superseded_path = os.path.join(out_dir, f"{game_id}{other_suffix}") if game_id in existing_ids else None
+    # Only revalidate files that are actually on disk; otherwise a 304 would leave nothing saved
+    cache_entry = http_cache.get(json_url) if game_id in existing_ids else None
+    try:
+        async with sem:
+            request = client.build_request("GET", json_url, headers=_conditional_headers(cache_entry))
+            resp = await _send_with_retry(client, limiter, request)
+            try:
+                if resp.status_code == 304:
+                    logging.info(f"[save_raw_json_reports]   → {game_id} not modified since last download; keeping existing file.")
+                    return False
+                resp.raise_for_status()
+                validators = _validators_from(resp.headers)
+                content_encoding = resp.headers.get("Content-Encoding", "identity")
+                bytes_written = 0
+                f = await asyncio.to_thread(_open_report_writer, tmp_path)
+                try:
+                    # Chunks only land in in-memory buffers here (reports are smaller than WRITE_BUFFER_SIZE);
+                    # the actual write()/close() syscalls happen in _finish_write on a worker thread.
+                    async for chunk in resp.aiter_bytes(STREAM_CHUNK_SIZE):
+                        f.write(chunk)
+                        bytes_written += len(chunk)
+                    if bytes_written:
+                        await asyncio.to_thread(_finish_write, f, tmp_path, json_file_path, superseded_path)
+                    else:
+                        f.close()
+                        _remove_partial(tmp_path)
+                except BaseException:
+                    with contextlib.suppress(Exception):
+                        f.close()
+                    _remove_partial(tmp_path) # Never leave a truncated report behind
+                    raise
+            finally:
+                await resp.aclose()
+    except httpx.HTTPStatusError as http_err:
+        logging.error(f"[save_raw_json_reports]   HTTP error for game ID {game_id} ({json_url}): {http_err.response.status_code} {http_err.response.reason_phrase}")
+        return False
+    except httpx.HTTPError as e:
+        logging.error(f"[save_raw_json_reports]   Error fetching JSON for game ID {game_id} ({json_url}): {e!r}")
+        return False
+    except ValueError as json_err: # JSONDecodeError, or UnicodeDecodeError for a non-UTF body
+        logging.error(f"[save_raw_json_reports]   Error decoding JSON for game ID {game_id} ({json_url}): {json_err}")
+        return False
+    except IOError as io_err:
+        logging.error(f"[save_raw_json_reports]   Error saving JSON file for {game_id}: {io_err}")
+        return False
+
+    if not bytes_written:
+        logging.warning(f"[save_raw_json_reports]   Skipping save for {game_id} due to empty response body.")
+        return False
+
+    if validators["etag"] or validators["last_modified"]:
+        http_cache[json_url] = {**validators, "path": json_file_path}
+    logging.info(f"[save_raw_json_reports]   → Saved raw JSON report for {game_id} to {json_file_path} ({resp.http_version}, encoding: {content_encoding})")
+    return True
+
+async def _run(ids: list[str], out_dir: str, http_cache: dict, existing_ids: set[str]) -> int:
+    """
+    Download all given game IDs concurrently (bounded by MAX_CONCURRENT_DOWNLOADS and
+    MAX_REQUESTS_PER_SECOND). Returns the number saved.
+    With HTTP/2 the in-flight requests are multiplexed over a single connection to official.nba.com;
+    httpx falls back to a pool of HTTP/1.1 keep-alive connections if the server doesn't negotiate h2.
+    """
+    sem = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+    limiter = AsyncLimiter(max_rate=MAX_REQUESTS_PER_SECOND, time_period=1.0)
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        retries=MAX_RETRIES, # connect errors only; status codes are retried in _send_with_retry
+    )
+    async with httpx.AsyncClient(headers=HEADERS, timeout=REQUEST_TIMEOUT, follow_redirects=True, transport=transport) as client:
+        results = await asyncio.gather(*[_fetch_one(client, sem, limiter, gid, out_dir, http_cache, existing_ids) for gid in ids])
+    return sum(results)
 
 if __name__ == "__main__":
     save_raw_json_reports(output_dir="1nba-bad-call-tracker/raw_reports_json", test_mode_limit=0) # Changed output dir name
@@ -1,17 +1,35 @@
 import os
-import json
-from openai import OpenAI, RateLimitError, APIStatusError # Import specific error types
+import json # Only for json.JSONDecodeError, which orjson.JSONDecodeError subclasses
+import orjson
+import argparse
+import hashlib
+from operator import itemgetter
+import sqlite3
+from contextlib import closing
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, RateLimitError, APIStatusError, APIConnectionError, LengthFinishReasonError # Import specific error types
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential, before_sleep_log
 from supabase import create_client, Client
 from supabase.lib.client_options import ClientOptions
 from dotenv import load_dotenv
 from pathlib import Path
+from functools import lru_cache
+from pydantic import BaseModel, ConfigDict, ValidationError
+from concurrent.futures import ThreadPoolExecutor
 
-# Load environment variables from .env file
-load_dotenv(dotenv_path=Path(__file__).parent.parent / ".env")
+# Load environment variables from .env file, unless they are already set
+# (e.g. exported by the shell, or inherited by a re-imported worker process)
+if not all(os.getenv(key) for key in ("OPENAI_API_KEY", "SUPABASE_URL", "SUPABASE_KEY")):
+    load_dotenv(dotenv_path=Path(__file__).parent.parent / ".env")
 
 from nba_api.stats.endpoints import BoxScoreSummaryV2 # Keep for referee lookup
+from nba_api.stats.library.http import NBAStatsHTTP
+import zstandard as zstd
+from aiolimiter import AsyncLimiter
 import logging
-import time
+import asyncio
 import re 
 
 # --- Configuration & Initialization ---
@@ -19,6 +37,26 @@ logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] %(
 
 QUOTA_ERROR_DETECTED = False
 
+_TEAM_RE = re.compile(r'\(([A-Z]{2,3})\)') # Matches 2 or 3 uppercase letters in parens
+_MISSING_COL_RE = re.compile(r"Could not find the '([^']*)' column")
+# 'Horford (BOS)' / 'Johnson&apos;s (ATL)' / 'Davis' (LAL)' in a play description: player surname followed by the team
+_DESCRIPTION_TEAM_RE = re.compile(r"([A-Za-z.'\-]+?)(?:&apos;s?|'s?)? \(([A-Z]{2,3})\)")
+
+# How many batches of games are processed at once; each one waits on OpenAI, then nba_api and Supabase
+CONCURRENCY = 8
+# Reports are read and parsed by LOAD_WORKERS threads, up to PREFETCH_BATCHES batches ahead of the ones in flight
+LOAD_WORKERS = 8
+PREFETCH_BATCHES = 2
+
+# Shared token bucket for stats.nba.com: NBA_API_MAX_RATE requests per NBA_API_TIME_PERIOD seconds
+# across all concurrent games (default 1 per 0.7s). Overridable from the environment.
+NBA_API_MAX_RATE = int(os.getenv("NBA_API_MAX_RATE", "1"))
+NBA_API_TIME_PERIOD = float(os.getenv("NBA_API_TIME_PERIOD", "0.7"))
+NBA_LIMITER = AsyncLimiter(max_rate=NBA_API_MAX_RATE, time_period=NBA_API_TIME_PERIOD)
+
+# Officials of a finished game never change, so lookups are cached on disk across runs
+OFFICIALS_CACHE_PATH = os.getenv("OFFICIALS_CACHE_PATH", str(Path(__file__).parent / ".cache" / "officials.sqlite3"))
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
@@ -34,14 +72,50 @@ if not SUPABASE_KEY:
     raise ValueError("SUPABASE_KEY environment variable not set.")
 
 try:
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    options = ClientOptions(postgrest_client_timeout=10, storage_client_timeout=10, schema="public")
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY, options=options)
-    logging.info("OpenAI and Supabase clients initialized successfully.")
+    # SDK-level retries are disabled; _call_openai retries with its own backoff policy instead
+    # One pooled HTTP/2 client for the whole run: concurrent requests share (and multiplex over) warm connections
+    client = AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        max_retries=0,
+        http_client=DefaultAsyncHttpxClient(http2=True, limits=httpx.Limits(max_keepalive_connections=64, max_connections=128)),
+    )
+    logging.info("OpenAI client initialized successfully.")
 except Exception as e:
-    logging.error(f"Error initializing API clients: {e}")
+    logging.error(f"Error initializing OpenAI client: {e}")
     raise
 
+# nba_api reuses a single requests.Session for every endpoint call; give it a keep-alive pool
+# large enough that lookups running in parallel threads don't open and discard connections
+_nba_api_session = requests.Session()
+_nba_api_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=CONCURRENCY))
+NBAStatsHTTP.set_session(_nba_api_session)
+
+@lru_cache(maxsize=1)
+def get_supabase() -> Client:
+    """
+    Create the Supabase client on first use and reuse it afterwards,
+    so importing this module doesn't pay for client setup.
+    """
+    try:
+        options = ClientOptions(postgrest_client_timeout=10, storage_client_timeout=10, schema="public")
+        supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY, options=options)
+        logging.info("Supabase client initialized successfully.")
+        return supabase_client
+    except Exception as e:
+        logging.error(f"Error initializing Supabase client: {e}")
+        raise
+
+# --- Helper Function to Read a Saved L2M Report ---
+def load_l2m_report(file_path: str) -> dict:
+    """
+    Loads a saved L2M JSON report, transparently decompressing '.json.zst' files.
+    """
+    with open(file_path, "rb") as f:
+        if file_path.endswith(".zst"):
+            with zstd.ZstdDecompressor().stream_reader(f) as reader:
+                return orjson.loads(reader.read())
+        return orjson.loads(f.read())
+
 # --- Helper Function to Extract Team Abbreviation ---
 def extract_team_from_player_string(player_string: str | None) -> str | None:
     """
@@ -49,19 +123,92 @@ def extract_team_from_player_string(player_string: str | None) -> str | None:
     """
     if not player_string:
         return None
-    match = re.search(r'\(([A-Z]{2,3})\)', player_string) # Matches 2 or 3 uppercase letters in parens
+    match = _TEAM_RE.search(player_string)
     if match:
         return match.group(1)
     return None
 
+def _player_team(player: str | None, description_teams: dict, team_names: dict) -> str | None:
+    """
+    Team abbreviation for an L2M 'CP'/'DP' entry, which is either 'Name (TEAM)', a bare player name
+    looked up by surname in the play description, or a team nickname like 'Pistons'.
+    """
+    if not player:
+        return None
+    return (
+        extract_team_from_player_string(player)
+        or team_names.get(player)
+        or description_teams.get(player.split()[-1])
+    )
+
+def resolve_play_teams(play: dict, game_info: dict) -> tuple[str | None, str | None]:
+    """
+    Determines (team_favored, team_penalized) for an incorrect call without the AI:
+    for an IC the committing player's team was penalized and the disadvantaged player's team favored,
+    for an INC the other way around. A side that can't be found is inferred as the opponent of the other.
+    Returns (None, None) if the teams can't be determined.
+    """
+    home, away = game_info.get("Home_team_abbr"), game_info.get("Away_team_abbr")
+    team_names = {game_info.get("Home_team"): home, game_info.get("Away_team"): away}
+    description_teams = {}
+    for name, team in _DESCRIPTION_TEAM_RE.findall(play.get("Comment") or ""):
+        # Two players with the same surname on different teams: can't tell them apart
+        description_teams[name] = team if description_teams.get(name, team) == team else None
+
+    cp_team = _player_team(play.get("CP"), description_teams, team_names)
+    dp_team = _player_team(play.get("DP"), description_teams, team_names)
+    opponents = {home: away, away: home} if home and away else {}
+    cp_team = cp_team or opponents.get(dp_team)
+    dp_team = dp_team or opponents.get(cp_team)
+    if not cp_team or not dp_team or cp_team == dp_team:
+        return None, None
+
+    if play.get("CallRatingName") == "IC":
+        return dp_team, cp_team
+    if play.get("CallRatingName") == "INC":
+        return cp_team, dp_team
+    return None, None
+
 # --- Referee Lookup ---
-def fetch_game_officials(game_id: str) -> dict:
+def _open_officials_cache() -> sqlite3.Connection:
+    """
+    Opens the officials cache database, creating it on first use.
+    """
+    os.makedirs(os.path.dirname(OFFICIALS_CACHE_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(OFFICIALS_CACHE_PATH, timeout=10)
+    conn.execute("CREATE TABLE IF NOT EXISTS officials (game_id TEXT PRIMARY KEY, officials TEXT NOT NULL)")
+    return conn
+
+def _get_cached_officials(game_id: str) -> dict | None:
+    try:
+        with closing(_open_officials_cache()) as conn:
+            row = conn.execute("SELECT officials FROM officials WHERE game_id = ?", (game_id,)).fetchone()
+        return orjson.loads(row[0]) if row else None
+    except (sqlite3.Error, OSError, ValueError) as e: # The cache is only an optimization, fall back to a live lookup
+        logging.warning(f"Could not read officials cache for game_id {game_id}: {e}")
+        return None
+
+def _cache_officials(game_id: str, officials_dict: dict):
+    try:
+        with closing(_open_officials_cache()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO officials (game_id, officials) VALUES (?, ?)", (game_id, orjson.dumps(officials_dict).decode()))
+    except (sqlite3.Error, OSError) as e:
+        logging.warning(f"Could not write officials cache for game_id {game_id}: {e}")
+
+async def fetch_game_officials(game_id: str) -> dict:
     """
     Return a dictionary of officials' full names for the given NBA game ID.
+    Results are served from the on-disk cache when the game has been looked up before.
     """
+    cached = await asyncio.to_thread(_get_cached_officials, game_id)
+    if cached is not None:
+        logging.info(f"Using cached officials for game_id {game_id}.")
+        return cached
+
     try:
-        time.sleep(0.6) 
-        summary = BoxScoreSummaryV2(game_id=game_id, timeout=15)
+        # nba_api is synchronous (requests), so run the lookup in a worker thread
+        async with NBA_LIMITER:
+            summary = await asyncio.to_thread(BoxScoreSummaryV2, game_id=game_id, timeout=15)
         data = summary.get_normalized_dict()
         names: list[str] = []
         for row in data.get("Officials", []):
@@ -81,184 +228,418 @@ def fetch_game_officials(game_id: str) -> dict:
             f"Fetched officials for game_id {game_id}: "
             f"{', '.join(filter(None, officials_dict.values())) or 'None'}"
         )
+        if names: # Don't cache empty results, the officials may just not be published yet
+            await asyncio.to_thread(_cache_officials, game_id, officials_dict)
         return officials_dict
     except Exception as e:
         logging.error(f"Error fetching officials for game_id {game_id}: {e}")
         return {"ref_1": None, "ref_2": None, "ref_3": None}
 
-# --- AI Parsing (Focused Task) ---
-def get_favored_penalized_teams_with_ai(plays_for_ai_processing: list[dict], game_id_for_context: str) -> list[dict]:
+# --- OpenAI Call with Retries ---
+OPENAI_MODEL = "gpt-4o-mini"
+OPENAI_MAX_ATTEMPTS = 6
+OPENAI_MAX_WAIT = 60 # seconds
+
+def _is_insufficient_quota(e: Exception) -> bool:
     """
-    Sends a list of pre-processed plays to OpenAI.
-    AI's task is to add 'team_favored' and 'team_penalized' to each play object
-    ONLY for incorrect calls/non-calls.
+    True if an OpenAI error means the account is out of quota (retrying won't help).
     """
-    global QUOTA_ERROR_DETECTED
-    if QUOTA_ERROR_DETECTED:
-        logging.warning(f"Skipping OpenAI call for game_id {game_id_for_context} due to previously detected quota error.")
-        return plays_for_ai_processing # Return original plays, favored/penalized will be null
+    body = getattr(e, 'body', None)
+    return getattr(e, 'code', None) == 'insufficient_quota' or (isinstance(body, dict) and body.get('type') == 'insufficient_quota')
 
-    if not plays_for_ai_processing:
-        logging.info(f"No plays provided to AI for game_id {game_id_for_context}.")
-        return []
+def _is_transient_openai_error(e: BaseException) -> bool:
+    """
+    Timeouts, connection errors, 429 rate limits (but not insufficient_quota) and 5xx are worth retrying.
+    """
+    if isinstance(e, APIConnectionError): # Includes APITimeoutError
+        return True
+    if isinstance(e, RateLimitError):
+        return not _is_insufficient_quota(e)
+    if isinstance(e, APIStatusError):
+        return e.status_code >= 500
+    return False
+
+_exponential_jitter_wait = wait_random_exponential(multiplier=1, max=OPENAI_MAX_WAIT)
+
+def _wait_for_openai_retry(retry_state) -> float:
+    """
+    Honor the server's Retry-After header when present, otherwise use exponential backoff with jitter.
+    """
+    response = getattr(retry_state.outcome.exception(), 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        return min(float(retry_after), OPENAI_MAX_WAIT)
+    except (TypeError, ValueError):
+        return _exponential_jitter_wait(retry_state)
+
+# Transient failures are retried; anything else (or the last failed attempt) is raised to the caller
+_openai_retry = retry(
+    retry=retry_if_exception(_is_transient_openai_error),
+    wait=_wait_for_openai_retry,
+    stop=stop_after_attempt(OPENAI_MAX_ATTEMPTS),
+    before_sleep=before_sleep_log(logging.getLogger(), logging.WARNING),
+    reraise=True,
+)
+
+@_openai_retry
+async def _call_openai(games: list[tuple[str, list[dict]]]):
+    """
+    Single chat completion request for a batch of games, retried by _openai_retry.
+    The answer is parsed into AugmentedGames by the SDK.
+    """
+    return await client.beta.chat.completions.parse(**_completion_params(games), response_format=AugmentedGames)
 
-    # Prepare context for AI: game_id and the list of plays (which now include Python-derived fields)
+# --- AI Parsing (Focused Task) ---
+# Number of games whose plays are sent to OpenAI in a single request, so the system prompt
+# and HTTP round trip are paid once per batch instead of once per game. Overridable from the environment.
+AI_BATCH_SIZE = max(1, int(os.getenv("AI_BATCH_SIZE", "10")))
+
+# Kept byte-identical across requests (no formatting, always the first message), so OpenAI's
+# automatic prompt caching can reuse it once a request's prefix passes 1024 tokens
+SYSTEM_PROMPT = (
+    "You are an expert NBA Last Two Minute (L2M) report analyst.\n"
+    "You will be given a JSON object with a single key 'games'. It is an array of objects, each with a 'game_id' and a 'plays' array.\n"
+    "Each play is an incorrect call or non-call, with these keys:\n"
+    "- 'i': the play's index within its game.\n"
+    "- 'd': the decision, 'IC' (Incorrect Call) or 'INC' (Incorrect Non-Call).\n"
+    "- 'cp': the Committing Player (sometimes a team name), or null.\n"
+    "- 'dp': the Disadvantaged Player (sometimes a team name), or null.\n"
+    "- 'desc': the L2M description of the play, where players are usually followed by their team abbreviation in parentheses, e.g. 'Holiday (BOS)'.\n"
+    "Your task is to ANALYZE EACH play and determine two values: 'team_favored' and 'team_penalized'.\n"
+    "Return **one JSON object** with a single key `\"augmented_games\"`. The value must be an array with one entry per input game, each of the form `{\"game_id\": ..., \"augmented_plays\": [...]}`, where 'augmented_plays' has one entry for every play of that game.\n"
+    "Rules for 'team_favored' and 'team_penalized' (both are team abbreviations):\n"
+    "1. Find the teams of 'cp' and 'dp' from 'desc' (or from the team name itself).\n"
+    "   - If 'd' is 'IC':\n"
+    "     - `team_penalized`: the team of 'cp' (who was incorrectly called).\n"
+    "     - `team_favored`: the team of 'dp' (or the opposing team to 'cp').\n"
+    "   - If 'd' is 'INC':\n"
+    "     - `team_penalized`: the team of 'dp' (who was disadvantaged by the missed call).\n"
+    "     - `team_favored`: the team of 'cp' (who committed the uncalled infraction).\n"
+    "   - If a team cannot be clearly determined from the provided context, set the respective field to `null`.\n"
+    "2. Each entry in 'augmented_plays' has exactly three keys: the play's unchanged 'i', 'team_favored' and 'team_penalized'.\n"
+    "Example of an input play in a game's 'plays':\n"
+    "    {\"i\": 0, \"d\": \"IC\", \"cp\": \"Jrue Holiday\", \"dp\": \"Andrew Nembhard\", \"desc\": \"Holiday (BOS) makes contact with the arm of Nembhard (IND) during his jump shot attempt.\"}\n"
+    "Expected output for this play within that game's 'augmented_plays' array:\n"
+    "    {\"i\": 0, \"team_favored\": \"IND\", \"team_penalized\": \"BOS\"}\n"
+)
+
+def _build_messages(games: list[tuple[str, list[dict]]]) -> list[dict]:
+    """
+    Chat messages asking the AI to augment the plays of one or more games.
+    Only the fields the AI needs are sent, under short keys; each play is tagged with its index 'i'
+    so the answer can be re-joined with the full play even if the AI reorders it.
+    """
     context_for_ai = {
-        "game_id_context": game_id_for_context,
-        "plays_to_augment": plays_for_ai_processing # Plays already have period, decision, is_correct_decision etc.
+        "games": [
+            {
+                "game_id": game_id,
+                "plays": [
+                    {"i": i, "d": play["decision"], "cp": play["source_CP"], "dp": play["source_DP"], "desc": play["description"]}
+                    for i, play in enumerate(plays)
+                ],
+            }
+            for game_id, plays in games
+        ]
+    }
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": orjson.dumps(context_for_ai).decode()}, # Compact: whitespace costs tokens
+    ]
+
+# The answer is two short fields per play, so output is capped to keep latency and TPM usage bounded
+OPENAI_MAX_TOKENS_PER_PLAY = 220
+OPENAI_MAX_OUTPUT_TOKENS = 4096
+
+class AugmentedPlay(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    i: int
+    team_favored: str | None
+    team_penalized: str | None
+
+class AugmentedGame(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    game_id: str
+    augmented_plays: list[AugmentedPlay]
+
+class AugmentedGames(BaseModel):
+    """Structured output the AI must return; OpenAI enforces its JSON schema strictly."""
+    model_config = ConfigDict(extra="forbid")
+    augmented_games: list[AugmentedGame]
+
+# Batch API request lines can't pass the model itself, so they send its strict JSON schema
+AUGMENTED_GAMES_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "augmented_games", "strict": True, "schema": AugmentedGames.model_json_schema()},
+}
+
+def _completion_params(games: list[tuple[str, list[dict]]]) -> dict:
+    """
+    Chat completion parameters for a batch of games, shared by interactive requests and Batch API request lines.
+    The response format (the AugmentedGames schema) is added by the caller.
+    """
+    n_plays = sum(len(plays) for _, plays in games)
+    return {
+        "model": OPENAI_MODEL,
+        "messages": _build_messages(games),
+        "temperature": 0.0,
+        "max_tokens": min(OPENAI_MAX_OUTPUT_TOKENS, OPENAI_MAX_TOKENS_PER_PLAY * n_plays),
     }
 
-    system_prompt = (
-        "You are an expert NBA Last Two Minute (L2M) report analyst.\n"
-        "You will be given a JSON object containing 'game_id_context' and 'plays_to_augment'.\n"
-        "'plays_to_augment' is an array of play objects that have already been partially processed. Each play object includes 'period', 'time', 'call_type', 'decision', 'is_correct_decision', 'description', and original context fields like 'source_CP' (Committing Player string from L2M JSON) and 'source_DP' (Disadvantaged Player string from L2M JSON).\n"
-        "Your task is to ANALYZE EACH play object and ADD two new keys: 'team_favored' and 'team_penalized'.\n"
-        "Return **one JSON object** with a single key `\"augmented_plays\"`. The value must be an array of these play objects, each now including 'team_favored' and 'team_penalized'.\n"
-        "Rules for 'team_favored' and 'team_penalized':\n"
-        "1. If 'is_correct_decision' in the input play object is `true` (i.e., decision is 'CC' or 'CNC'), then 'team_favored' and 'team_penalized' for that play MUST be `null`.\n"
-        "2. If 'is_correct_decision' is `false` (i.e., decision is 'IC' or 'INC'):\n"
-        "   - Analyze the 'description', 'source_CP', and 'source_DP' fields to infer the teams.\n"
-        "   - 'source_CP' and 'source_DP' are strings like 'Player Name (TEAM_ABBREVIATION)'. Extract the TEAM_ABBREVIATION.\n"
-        "   - If 'decision' is 'IC' (Incorrect Call):\n"
-        "     - `team_penalized`: Should be the team of the player in 'source_CP' (who was incorrectly called).\n"
-        "     - `team_favored`: Should be the team of the player in 'source_DP' (or the opposing team to 'source_CP').\n"
-        "   - If 'decision' is 'INC' (Incorrect Non-Call):\n"
-        "     - `team_penalized`: Should be the team of the player in 'source_DP' (who was disadvantaged by the missed call).\n"
-        "     - `team_favored`: Should be the team of the player in 'source_CP' (who committed the uncalled infraction).\n"
-        "   - If a team cannot be clearly determined from the provided context even for an incorrect call, set the respective field to `null`.\n"
-        "3. Ensure the output for each play includes ALL original keys from the input 'plays_to_augment' PLUS the new 'team_favored' and 'team_penalized' keys.\n"
-        "Example of an input play object in 'plays_to_augment':\n"
-        "    {\n"
-        "      \"period\": 4,\n"
-        "      \"time\": \"0:46.2\",\n"
-        "      \"call_type\": \"Foul: Shooting\",\n"
-        "      \"decision\": \"IC\",\n"
-        "      \"is_correct_decision\": false,\n"
-        "      \"description\": \"Holiday (BOS) makes contact with the arm of Nembhard (IND) during his jump shot attempt.\",\n"
-        "      \"source_CP\": \"Holiday, Jrue (BOS)\",\n"
-        "      \"source_DP\": \"Nembhard, Andrew (IND)\"\n"
-        "    }\n"
-        "Expected output for this play within the 'augmented_plays' array:\n"
-        "    {\n"
-        "      \"period\": 4,\n"
-        "      \"time\": \"0:46.2\",\n"
-        "      \"call_type\": \"Foul: Shooting\",\n"
-        "      \"decision\": \"IC\",\n"
-        "      \"is_correct_decision\": false,\n"
-        "      \"description\": \"Holiday (BOS) makes contact with the arm of Nembhard (IND) during his jump shot attempt.\",\n"
-        "      \"source_CP\": \"Holiday, Jrue (BOS)\",\n"
-        "      \"source_DP\": \"Nembhard, Andrew (IND)\",\n"
-        "      \"team_favored\": \"IND\",\n"
-        "      \"team_penalized\": \"BOS\"\n"
-        "    }\n"
+def _merge_augmented_games(parsed: AugmentedGames, games: list[tuple[str, list[dict]]]) -> dict[str, list[dict]]:
+    """
+    Merges 'team_favored'/'team_penalized' from the AI answer back onto the original plays.
+    The schema guarantees the shape of the answer, but not that it covers every play, so
+    returns {game_id: augmented_plays} only for games answered with exactly one entry per 'i'.
+    """
+    answers = {game.game_id: game.augmented_plays for game in parsed.augmented_games}
+    augmented = {}
+    for game_id, plays in games:
+        answer = answers.get(game_id)
+        if answer is None:
+            logging.warning(f"AI response has no 'augmented_plays' for game_id {game_id}.")
+            continue
+        by_index = {play.i: play for play in answer}
+        if len(answer) != len(plays) or set(by_index) != set(range(len(plays))):
+            logging.warning(f"AI returned a different set of plays ({len(answer)}) than expected ({len(plays)}) for game_id {game_id}.")
+            continue
+        augmented[game_id] = [
+            {**play, "team_favored": by_index[i].team_favored, "team_penalized": by_index[i].team_penalized}
+            for i, play in enumerate(plays)
+        ]
+    return augmented
+
+def _log_usage(usage, game_ids: str):
+    """Logs token usage of a completion, including how much of the prompt was served from OpenAI's prompt cache."""
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details else 0
+    logging.info(
+        f"OpenAI usage for game_id(s) {game_ids}: {usage.prompt_tokens} prompt tokens "
+        f"({cached_tokens} cached), {usage.completion_tokens} completion tokens."
     )
 
-    user_msg = {"role": "user", "content": json.dumps(context_for_ai, indent=2)} 
+async def get_favored_penalized_teams_with_ai(games: list[tuple[str, list[dict]]]) -> dict[str, list[dict]]:
+    """
+    Sends the pre-processed plays of a batch of games to OpenAI in a single request.
+    AI's task is to add 'team_favored' and 'team_penalized' to each play object
+    ONLY for incorrect calls/non-calls.
+    Games whose part of the answer fails validation are retried one request per game;
+    if that fails too (or on API errors) the original plays are returned for them.
+    Returns {game_id: plays}.
+    """
+    global QUOTA_ERROR_DETECTED
+    game_ids = ", ".join(game_id for game_id, _ in games)
+    originals = {game_id: plays for game_id, plays in games}
+    if QUOTA_ERROR_DETECTED:
+        logging.warning(f"Skipping OpenAI call for game_id(s) {game_ids} due to previously detected quota error.")
+        return originals # Return original plays, favored/penalized will be null
+
+    games = [(game_id, plays) for game_id, plays in games if plays]
+    if not games:
+        logging.info(f"No plays provided to AI for game_id(s) {game_ids}.")
+        return originals
 
-    logging.info(f"Sending {len(plays_for_ai_processing)} pre-processed plays for game_id {game_id_for_context} to OpenAI for augmentation.")
-    response_content = None
+    logging.info(f"Sending {sum(len(plays) for _, plays in games)} pre-processed plays for {len(games)} game(s) ({game_ids}) to OpenAI for augmentation.")
     try:
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini", 
-            messages=[{"role": "system", "content": system_prompt}, user_msg],
-            temperature=0.0,
-            response_format={"type": "json_object"}
-        )
-        response_content = completion.choices[0].message.content
-        parsed_json = json.loads(response_content)
-
-        if isinstance(parsed_json, dict) and "augmented_plays" in parsed_json and isinstance(parsed_json["augmented_plays"], list):
-            augmented_plays_list = parsed_json["augmented_plays"]
-            # Basic validation: check if the number of plays returned matches the input
-            if len(augmented_plays_list) == len(plays_for_ai_processing):
-                logging.info(f"Successfully augmented {len(augmented_plays_list)} plays from AI for game_id {game_id_for_context}.")
-                return augmented_plays_list
-            else:
-                logging.warning(f"AI returned a different number of plays ({len(augmented_plays_list)}) than expected ({len(plays_for_ai_processing)}) for game_id {game_id_for_context}. Using original plays.")
-                # Fallback to original plays if AI response structure is problematic regarding play count
-                return plays_for_ai_processing 
+        completion = await _call_openai(games)
+        _log_usage(completion.usage, game_ids)
+        message = completion.choices[0].message
+        if message.parsed is None:
+            logging.warning(f"AI returned no answer for game_id(s) {game_ids}. Refusal: {message.refusal}")
+            augmented = {}
         else:
-            logging.warning(f"AI response for {game_id_for_context} missing 'augmented_plays' key or not a list. Full response: {response_content[:300]}... Using original plays.")
-            return plays_for_ai_processing
+            augmented = _merge_augmented_games(message.parsed, games)
+    except LengthFinishReasonError as e:
+        # Truncated at max_tokens: the JSON can't be complete
+        logging.warning(f"AI response for game_id(s) {game_ids} was cut off at max_tokens.")
+        _log_usage(e.completion.usage, game_ids)
+        augmented = {}
     except RateLimitError as e:
-        logging.error(f"OpenAI RateLimitError for game_id {game_id_for_context}: {e}")
-        if hasattr(e, 'body') and e.body and 'type' in e.body and e.body['type'] == 'insufficient_quota':
+        logging.error(f"OpenAI RateLimitError for game_id(s) {game_ids}: {e}")
+        if _is_insufficient_quota(e):
             logging.error("INSUFFICIENT QUOTA DETECTED. Further OpenAI calls will be skipped.")
             QUOTA_ERROR_DETECTED = True
-        return plays_for_ai_processing # Return original on error
+        return originals # Return original on error
     except APIStatusError as e:
-        logging.error(f"OpenAI APIStatusError for game_id {game_id_for_context}: {e.status_code} - {e.response}")
-        if e.status_code == 429 and hasattr(e, 'body') and e.body and 'type' in e.body and e.body['type'] == 'insufficient_quota':
+        logging.error(f"OpenAI APIStatusError for game_id(s) {game_ids}: {e.status_code} - {e.response}")
+        if e.status_code == 429 and _is_insufficient_quota(e):
              logging.error("INSUFFICIENT QUOTA DETECTED (via APIStatusError). Further OpenAI calls will be skipped.")
              QUOTA_ERROR_DETECTED = True
-        return plays_for_ai_processing # Return original on error
-    except json.JSONDecodeError as e:
-        logging.error(f"JSONDecodeError for game_id {game_id_for_context}: {e}. Response from AI: {response_content[:500] if response_content else 'N/A'}. Using original plays.")
-        return plays_for_ai_processing # Return original on error
+        return originals # Return original on error
     except Exception as e:
-        logging.error(f"Unexpected error calling OpenAI API for game_id {game_id_for_context}: {e}. Using original plays.")
-        return plays_for_ai_processing # Return original on error
+        logging.error(f"Unexpected error calling OpenAI API for game_id(s) {game_ids}: {e}. Using original plays.")
+        return originals # Return original on error
+
+    logging.info(f"Successfully augmented plays from AI for {len(augmented)}/{len(games)} game(s).")
+    failed = [(game_id, plays) for game_id, plays in games if game_id not in augmented]
+    if failed and len(games) > 1:
+        # Fall back to one request per game for the games the batched answer got wrong
+        logging.warning(f"Retrying {len(failed)} game(s) individually after batched AI response failed validation.")
+        for result in await asyncio.gather(*[get_favored_penalized_teams_with_ai([game]) for game in failed]):
+            augmented.update(result)
+    elif failed:
+        logging.warning(f"Using original plays for game_id {failed[0][0]}.")
+    return {**originals, **augmented}
+
+
+# --- OpenAI Batch API (bulk runs) ---
+# Seconds between status checks of a submitted batch; batches complete within a 24h window
+BATCH_POLL_INTERVAL = 30
+BATCH_COMPLETION_WINDOW = "24h"
+_BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+def _build_batch_input(games: list[tuple[str, list[dict]]]) -> bytes:
+    """
+    Batch API input file: one JSONL request line per game, with the game_id as its custom_id.
+    """
+    lines = [
+        orjson.dumps({
+            "custom_id": game_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {**_completion_params([(game_id, plays)]), "response_format": AUGMENTED_GAMES_RESPONSE_FORMAT},
+        })
+        for game_id, plays in games
+    ]
+    return b"\n".join(lines) + b"\n"
+
+def _parse_batch_output(output: str, games: list[tuple[str, list[dict]]]) -> dict[str, list[dict]]:
+    """
+    Reads the Batch API output file and returns {game_id: augmented_plays} for every game
+    whose response passed validation.
+    """
+    plays_by_game = dict(games)
+    augmented = {}
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        result = orjson.loads(line)
+        game_id = result.get("custom_id")
+        response = result.get("response") or {}
+        if game_id not in plays_by_game or response.get("status_code") != 200:
+            logging.warning(f"Batch request for game_id {game_id} failed: {result.get('error') or response.get('status_code')}")
+            continue
+        try:
+            choice = response["body"]["choices"][0]
+            if choice.get("finish_reason") == "length":
+                logging.warning(f"Batch response for game_id {game_id} was cut off at max_tokens.")
+                continue
+            parsed = AugmentedGames.model_validate_json(choice["message"]["content"])
+            augmented.update(_merge_augmented_games(parsed, [(game_id, plays_by_game[game_id])]))
+        except (KeyError, IndexError, TypeError, ValidationError) as e:
+            logging.error(f"Could not read batch response for game_id {game_id}: {e}")
+    return augmented
 
+async def get_favored_penalized_teams_with_batch(games: list[tuple[str, list[dict]]]) -> dict[str, list[dict]]:
+    """
+    Same as get_favored_penalized_teams_with_ai, but submits every game as one OpenAI Batch API job
+    (half the price, separate rate limits) and waits for it to finish.
+    Games that fail (or the whole job, on error) keep their original plays. Returns {game_id: plays}.
+    """
+    global QUOTA_ERROR_DETECTED
+    originals = {game_id: plays for game_id, plays in games}
+    games = [(game_id, plays) for game_id, plays in games if plays]
+    if not games:
+        logging.info("No plays to submit to the OpenAI Batch API.")
+        return originals
 
-# --- Supabase Interaction ---
-def delete_existing_plays(game_id: str):
-    """Deletes existing plays for a given game_id to ensure idempotency."""
     try:
-        logging.info(f"Deleting existing plays for game_id: {game_id} from table 'calls'.")
-        response = supabase.table("calls").delete().eq("game_id", game_id).execute()
-        if hasattr(response, 'error') and response.error:
-            logging.error(f"Error deleting plays for game_id {game_id}: {response.error.message if hasattr(response.error, 'message') else response.error}")
-            raise Exception(f"Supabase delete error: {response.error.message if hasattr(response.error, 'message') else response.error}")
-        else:
-            logging.info(f"Delete operation for existing plays for game_id {game_id} completed.")
+        batch_input = _build_batch_input(games)
+        input_file = await _openai_retry(client.files.create)(file=("l2m_batch.jsonl", batch_input), purpose="batch")
+        batch = await _openai_retry(client.batches.create)(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=BATCH_COMPLETION_WINDOW,
+        )
+        logging.info(f"Submitted OpenAI batch {batch.id} with {len(games)} game(s) ({sum(len(plays) for _, plays in games)} plays).")
+
+        while batch.status not in _BATCH_FINAL_STATUSES:
+            await asyncio.sleep(BATCH_POLL_INTERVAL)
+            batch = await _openai_retry(client.batches.retrieve)(batch.id)
+            counts = batch.request_counts
+            logging.info(f"OpenAI batch {batch.id}: {batch.status} ({counts.completed if counts else 0}/{counts.total if counts else len(games)} requests done).")
+
+        if batch.status != "completed" or not batch.output_file_id:
+            logging.error(f"OpenAI batch {batch.id} ended with status '{batch.status}': {batch.errors}. Using original plays.")
+            return originals
+
+        output = await _openai_retry(client.files.content)(batch.output_file_id)
+        augmented = _parse_batch_output(output.text, games)
+    except APIStatusError as e:
+        logging.error(f"OpenAI APIStatusError while running batch: {e.status_code} - {e.response}")
+        if e.status_code == 429 and _is_insufficient_quota(e):
+            logging.error("INSUFFICIENT QUOTA DETECTED (via APIStatusError). Further OpenAI calls will be skipped.")
+            QUOTA_ERROR_DETECTED = True
+        return originals # Return original on error
     except Exception as e:
-        logging.error(f"Exception during deletion of plays for game_id {game_id}: {e}")
-        raise 
+        logging.error(f"Unexpected error running OpenAI batch: {e}. Using original plays.")
+        return originals # Return original on error
+
+    logging.info(f"Successfully augmented plays from the OpenAI batch for {len(augmented)}/{len(games)} game(s).")
+    return {**originals, **augmented}
+
+
+# --- Supabase Interaction ---
+# Columns identifying a play; re-running a game updates its rows in place instead of duplicating them
+CALLS_CONFLICT_COLUMNS = "game_id,period,time,call_type,description_hash"
 
-def insert_plays_to_supabase(game_id: str, plays_to_insert: list[dict], officials: dict):
+def _play_hash(description: str, committing_player: str | None, disadvantaged_player: str | None) -> str:
     """
-    Inserts processed plays into the Supabase 'calls' table using batch insert.
-    'plays_to_insert' contains plays with Python-derived fields and AI-augmented favored/penalized teams.
+    Short hash of a play's description and players, to tell apart different plays at the same time.
+    The players are included because distinct calls can share a description (e.g. two lane violations).
     """
-    if not plays_to_insert:
-        logging.info(f"No plays to insert for game_id: {game_id}")
-        return 0
+    key = f"{description}\x1f{committing_player or ''}\x1f{disadvantaged_player or ''}"
+    return hashlib.md5(key.encode()).digest()[:8].hex()
+
+# Rows per upsert request, and how many of a game's requests may be in flight at once.
+# Smaller requests stay well within postgrest_client_timeout and fail (and retry) independently.
+SUPABASE_CHUNK_SIZE = max(1, int(os.getenv("SUPABASE_CHUNK_SIZE", "64")))
+SUPABASE_CHUNK_CONCURRENCY = 4
+
+# Play fields copied into a 'calls' record. The first six are set by Python pre-processing and
+# must not be None; the team fields come from Python or the AI and may be None.
+_CALL_FIELDS = ("period", "time", "call_type", "decision", "is_correct_decision", "description", "team_favored", "team_penalized")
+_N_REQUIRED_CALL_FIELDS = 6
+_CALL_FIELD_SET = frozenset(_CALL_FIELDS)
+_get_call_fields = itemgetter(*_CALL_FIELDS)
+
+def build_call_records(game_id: str, plays_to_insert: list[dict], officials: dict) -> list[dict]:
+    """
+    Turns processed plays into 'calls' table records, dropping plays that are missing critical fields.
+    """
+    # Same for every play of the game
+    game_fields = {"game_id": game_id, "ref_1": officials.get("ref_1"), "ref_2": officials.get("ref_2"), "ref_3": officials.get("ref_3")}
 
     records_to_insert = []
     for play_data in plays_to_insert: # play_data now comes from AI or Python pre-processing
-        record = {
-            "game_id": game_id, 
-            "period": play_data.get("period"), # Should be set by Python pre-processing
-            "time": play_data.get("time"), # Should be set by Python pre-processing
-            "call_type": play_data.get("call_type"), # Should be set by Python pre-processing
-            "decision": play_data.get("decision"), # Should be set by Python pre-processing
-            "is_correct_decision": play_data.get("is_correct_decision"), # Should be set by Python pre-processing
-            "description": play_data.get("description"), # Should be set by Python pre-processing
-            "team_favored": play_data.get("team_favored"), # This is from AI
-            "team_penalized": play_data.get("team_penalized"), # This is from AI
-            "ref_1": officials.get("ref_1"), 
-            "ref_2": officials.get("ref_2"),
-            "ref_3": officials.get("ref_3"),
-        }
+        values = _get_call_fields(play_data) if _CALL_FIELD_SET <= play_data.keys() else None
         # Validate essential fields that should have been set by Python pre-processing or AI
-        if not all(key in record and record[key] is not None for key in ["time", "call_type", "description", "period", "is_correct_decision", "decision"]):
+        if values is None or None in values[:_N_REQUIRED_CALL_FIELDS]:
             logging.warning(f"Skipping play for game_id {game_id} due to missing critical fields after AI processing: {play_data}")
             continue
+        record = dict(zip(_CALL_FIELDS, values))
+        record.update(game_fields)
+        record["description_hash"] = _play_hash(record["description"], play_data.get("source_CP"), play_data.get("source_DP"))
         records_to_insert.append(record)
 
-    if not records_to_insert:
-        logging.info(f"No valid plays to insert for game_id: {game_id} after validation.")
-        return 0
+    # Postgres rejects an upsert that touches the same row twice; only exact duplicate plays share a key,
+    # so dropping records whose data is fully identical is enough
+    return list({tuple(record.items()): record for record in records_to_insert}.values())
 
+def _upsert_calls(game_id: str, records_to_insert: list[dict]) -> int:
+    """
+    Upserts one chunk of records into the 'calls' table. Returns the number of plays written.
+    """
     try:
-        logging.info(f"Attempting to batch insert {len(records_to_insert)} plays for game_id: {game_id} into table 'calls'.")
-        response = supabase.table("calls").insert(records_to_insert).execute()
+        logging.info(f"Attempting to batch upsert {len(records_to_insert)} plays for game_id: {game_id} into table 'calls'.")
+        response = get_supabase().table("calls").upsert(records_to_insert, on_conflict=CALLS_CONFLICT_COLUMNS).execute()
         
         if hasattr(response, 'error') and response.error:
             error_message = response.error.message if hasattr(response.error, 'message') else str(response.error)
             logging.error(f"Error inserting plays for game_id {game_id}: {error_message}")
             if "Could not find the" in error_message and "column" in error_message:
-                column_name_match = re.search(r"Could not find the '([^']*)' column", error_message)
+                column_name_match = _MISSING_COL_RE.search(error_message)
                 if column_name_match:
                     missing_column = column_name_match.group(1)
                     logging.error(f"HINT: The column '{missing_column}' seems to be missing in your Supabase 'calls' table or has a different name. Please check your table schema.")
@@ -278,18 +659,235 @@ def insert_plays_to_supabase(game_id: str, plays_to_insert: list[dict], official
         logging.error(f"Exception during Supabase insert for game_id {game_id}: {e}")
         return 0
 
+async def insert_plays_to_supabase(game_id: str, plays_to_insert: list[dict], officials: dict) -> int:
+    """
+    Upserts processed plays into the Supabase 'calls' table in chunks of SUPABASE_CHUNK_SIZE,
+    sent concurrently (at most SUPABASE_CHUNK_CONCURRENCY at a time).
+    'plays_to_insert' contains plays with Python-derived fields and AI-augmented favored/penalized teams.
+    Relies on a unique constraint over CALLS_CONFLICT_COLUMNS. Existing rows can't be backfilled
+    (the hash covers CP/DP, which 'calls' doesn't store), so clear the table and re-run this script:
+        DELETE FROM calls;
+        ALTER TABLE calls ADD COLUMN description_hash text NOT NULL;
+        ALTER TABLE calls ADD CONSTRAINT calls_play_key UNIQUE (game_id, period, time, call_type, description_hash);
+    Returns the number of plays written.
+    """
+    if not plays_to_insert:
+        logging.info(f"No plays to insert for game_id: {game_id}")
+        return 0
+
+    records_to_insert = build_call_records(game_id, plays_to_insert, officials)
+    if not records_to_insert:
+        logging.info(f"No valid plays to insert for game_id: {game_id} after validation.")
+        return 0
+
+    # Create the client here on the event loop: lru_cache doesn't lock, so the first calls
+    # from concurrent worker threads would each build (and log) their own client
+    get_supabase()
+    sem = asyncio.Semaphore(SUPABASE_CHUNK_CONCURRENCY)
+    async def upsert_chunk(chunk: list[dict]) -> int:
+        async with sem:
+            # supabase-py is synchronous, so run it in a worker thread
+            return await asyncio.to_thread(_upsert_calls, game_id, chunk)
+
+    chunks = [records_to_insert[i:i + SUPABASE_CHUNK_SIZE] for i in range(0, len(records_to_insert), SUPABASE_CHUNK_SIZE)]
+    return sum(await asyncio.gather(*[upsert_chunk(chunk) for chunk in chunks]))
+
 # --- Main Processing Logic ---
-def process_raw_reports(input_dir: str, test_mode_limit: int = 0):
+def preprocess_plays(source_plays: list[dict], game_id: str, game_info: dict | None = None) -> list[dict]:
+    """
+    Python-based transformations of the raw L2M plays into the shape stored in 'calls'.
+    'team_favored'/'team_penalized' of incorrect calls are filled in here when the teams can be read
+    from the play (see resolve_play_teams); the rest is left for the AI to populate.
+    'game_info' is the report's 'game' entry (home/away team names and abbreviations).
+    """
+    python_processed_plays = []
+    for play in source_plays:
+        period_name = play.get("PeriodName", "Q4") # Default to Q4 if missing
+        period = 4 # Default
+        if "OT" in period_name:
+            try:
+                period = 4 + int(period_name.replace("OT", ""))
+            except ValueError:
+                logging.warning(f"Could not parse OT period: {period_name} for game {game_id}. Defaulting to 5 for OT.")
+                period = 5 # Generic OT
+        elif period_name[1:].isdigit(): # Reports number overtimes on: 'Q5' is the first OT
+            period = int(period_name[1:])
+        
+        decision = play.get("CallRatingName")
+        is_correct = decision in ["CC", "CNC"] if decision else None
+        team_favored, team_penalized = resolve_play_teams(play, game_info or {}) if is_correct is False else (None, None)
+
+        processed_play = {
+            "period": period,
+            "time": play.get("PCTime"),
+            "call_type": play.get("CallType"),
+            "decision": decision,
+            "is_correct_decision": is_correct,
+            "description": play.get("Comment"),
+            # Pass original CP/DP for AI context, AI will use these to infer team favored/penalized
+            "source_CP": play.get("CP"), 
+            "source_DP": play.get("DP"),
+            "source_posTeamId": play.get("posTeamId"), # Kept with the play, but not sent to the AI
+            # Left as None for the AI to populate if Python couldn't resolve them
+            "team_favored": team_favored, 
+            "team_penalized": team_penalized
+        }
+        python_processed_plays.append(processed_play)
+    return python_processed_plays
+
+def _needs_ai(play: dict) -> bool:
+    """
+    Correct calls (CC/CNC) never favor or penalize a team, so they keep null 'team_favored'/'team_penalized';
+    only incorrect calls whose teams Python couldn't resolve are sent to the AI.
+    """
+    return play["is_correct_decision"] is False and (play["team_favored"] is None or play["team_penalized"] is None)
+
+def _plays_needing_ai(plays: list[dict]) -> list[dict]:
+    return [play for play in plays if _needs_ai(play)]
+
+def _merge_ai_plays(plays: list[dict], ai_plays: list[dict]) -> list[dict]:
+    """
+    Puts the AI-augmented plays returned for _plays_needing_ai(plays) back in their original positions.
+    """
+    ai_plays_iter = iter(ai_plays)
+    return [next(ai_plays_iter) if _needs_ai(play) else play for play in plays]
+
+def load_game(filename: str, input_dir: str) -> tuple[str, list[dict]] | None:
+    """
+    Loads and pre-processes one saved L2M report.
+    Returns (game_id, python_processed_plays), or None if the file can't be used.
+    """
+    game_id = filename.split(".", 1)[0]
+    file_path = os.path.join(input_dir, filename)
+    logging.info(f"--- Processing file: {filename} (Game ID: {game_id}) ---")
+    try:
+        l2m_json_content = load_l2m_report(file_path)
+
+        if not l2m_json_content or "l2m" not in l2m_json_content:
+            logging.warning(f"File {filename} is empty, not valid JSON, or missing 'l2m' key. Skipping.")
+            return None
+
+        game_info = (l2m_json_content.get("game") or [{}])[0]
+        python_processed_plays = preprocess_plays(l2m_json_content.get("l2m", []), game_id, game_info)
+        if not python_processed_plays:
+            logging.info(f"No plays to process after Python pre-processing for {game_id}.")
+        return game_id, python_processed_plays
+
+    except FileNotFoundError:
+        logging.error(f"File not found: {file_path}. Skipping.")
+    except json.JSONDecodeError as e:
+        logging.error(f"Failed to decode JSON from file {filename}: {e}. Skipping.")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred while processing file {filename}: {e}")
+    return None
+
+def _start_officials_lookups(games: list[tuple[str, list[dict]]]) -> dict[str, asyncio.Task]:
+    """
+    Starts fetch_game_officials for every game that has plays, so the lookups run while the AI is working.
+    """
+    return {game_id: asyncio.create_task(fetch_game_officials(game_id)) for game_id, plays in games if plays}
+
+async def store_game(game_id: str, ai_augmented_plays: list[dict], officials_task: asyncio.Task | None = None) -> int:
+    """
+    Looks up the officials for one game (or waits for the lookup already started in 'officials_task')
+    and writes its plays to Supabase. Returns the number of plays inserted.
+    """
+    if not ai_augmented_plays: # Check if AI returned anything (even if it's the original list on error)
+        logging.info(f"No plays returned from AI augmentation for {game_id}.")
+        return 0
+
+    officials = await (officials_task or fetch_game_officials(game_id))
+    try:
+        return await insert_plays_to_supabase(game_id, ai_augmented_plays, officials)
+    except Exception as e:
+        logging.error(f"Failed to process Supabase operations for {game_id} due to: {e}. Skipping DB operations for this game.")
+        return 0
+
+async def process_game_batch(games: list[tuple[str, list[dict]]], sem: asyncio.Semaphore) -> tuple[int, int]:
+    """
+    Augments a batch of pre-processed games with a single AI request while looking up their officials,
+    then writes the plays to Supabase for each game. Returns (games_processed, plays_inserted).
+    Runs under 'sem' so at most CONCURRENCY batches are in flight at once.
+    """
+    async with sem:
+        if QUOTA_ERROR_DETECTED:
+            logging.warning(f"OpenAI quota previously exceeded. Skipping game_id(s) {', '.join(game_id for game_id, _ in games)}.")
+            return 0, 0
+
+        officials_tasks = _start_officials_lookups(games)
+        ai_augmented = await get_favored_penalized_teams_with_ai([(game_id, _plays_needing_ai(plays)) for game_id, plays in games])
+        inserted = await asyncio.gather(*[
+            store_game(game_id, _merge_ai_plays(plays, ai_augmented[game_id]), officials_tasks.get(game_id))
+            for game_id, plays in games
+        ])
+        return len(games), sum(inserted)
+
+async def _store_games_from_batch_api(games: list[tuple[str, list[dict]]]) -> tuple[int, int]:
+    """
+    Augments all games with one OpenAI Batch API job, looking up their officials while it runs,
+    then writes them to Supabase, at most CONCURRENCY games at a time. Returns (games_processed, plays_inserted).
+    """
+    officials_tasks = _start_officials_lookups(games)
+    ai_augmented = await get_favored_penalized_teams_with_batch([(game_id, _plays_needing_ai(plays)) for game_id, plays in games])
+    if QUOTA_ERROR_DETECTED:
+        logging.warning("OpenAI quota exceeded. Skipping database writes for the batch.")
+        for task in officials_tasks.values():
+            task.cancel()
+        return 0, 0
+
+    sem = asyncio.Semaphore(CONCURRENCY)
+    async def store(game_id: str, plays: list[dict]) -> int:
+        async with sem:
+            return await store_game(game_id, _merge_ai_plays(plays, ai_augmented[game_id]), officials_tasks.get(game_id))
+
+    inserted = await asyncio.gather(*[store(game_id, plays) for game_id, plays in games])
+    return len(games), sum(inserted)
+
+async def _process_all(files_to_process: list[str], input_dir: str, mode: str = "interactive") -> tuple[int, int]:
+    """
+    Pre-processes the files in groups of AI_BATCH_SIZE and runs process_game_batch on each group
+    concurrently, at most CONCURRENCY batches at a time ('interactive'); the next PREFETCH_BATCHES
+    groups are loaded while those are waiting on the network.
+    Alternatively pre-processes every file and submits them as a single OpenAI Batch API job ('batch').
+    Returns (processed_files_count, total_plays_inserted_count).
+    """
+    loop = asyncio.get_running_loop()
+    # Reading, decompressing and parsing the reports is blocking work, so it runs in worker threads
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS, thread_name_prefix="l2m-load") as executor:
+        async def load_games(filenames: list[str]) -> list[tuple[str, list[dict]]]:
+            loaded = await asyncio.gather(*[loop.run_in_executor(executor, load_game, filename, input_dir) for filename in filenames])
+            return [game for game in loaded if game is not None]
+
+        if mode == "batch":
+            return await _store_games_from_batch_api(await load_games(files_to_process))
+
+        sem = asyncio.Semaphore(CONCURRENCY)
+        window = asyncio.Semaphore(CONCURRENCY + PREFETCH_BATCHES)
+        async def load_and_process(filenames: list[str]) -> tuple[int, int]:
+            async with window:
+                return await process_game_batch(await load_games(filenames), sem)
+
+        batches = [files_to_process[i:i + AI_BATCH_SIZE] for i in range(0, len(files_to_process), AI_BATCH_SIZE)]
+        results = await asyncio.gather(*[load_and_process(batch) for batch in batches])
+    processed_files_count = sum(processed for processed, _ in results)
+    total_plays_inserted_count = sum(inserted for _, inserted in results)
+    return processed_files_count, total_plays_inserted_count
+
+def process_raw_reports(input_dir: str, test_mode_limit: int = 0, mode: str = "interactive"):
     """
     Reads saved L2M JSON files, pre-processes data in Python,
     uses AI for specific inferences, and inserts into Supabase.
+    mode='batch' sends the AI requests through the OpenAI Batch API, which is cheaper
+    for large backfills but can take up to 24h; 'interactive' gets answers right away.
     """
-    global QUOTA_ERROR_DETECTED
     if not os.path.isdir(input_dir):
         logging.error(f"Input directory '{input_dir}' not found.")
         return
 
-    files = sorted([f for f in os.listdir(input_dir) if f.endswith(".json")])
+    # Reports are saved by fetch_l2m.py as {game_id}.json.zst (or plain {game_id}.json)
+    with os.scandir(input_dir) as entries:
+        # Dotfiles are sidecars written by fetch_l2m.py (e.g. its HTTP cache), not reports
+        files = sorted(e.name for e in entries if e.name.endswith((".json", ".json.zst")) and not e.name.startswith(".") and e.is_file())
     
     if not files:
         logging.info(f"No .json files found in '{input_dir}'.")
@@ -302,88 +900,7 @@ def process_raw_reports(input_dir: str, test_mode_limit: int = 0):
         logging.info(f"TEST MODE: Processing up to {test_mode_limit} JSON files.")
         files_to_process = files[:test_mode_limit]
 
-    processed_files_count = 0
-    total_plays_inserted_count = 0
-
-    for filename in files_to_process:
-        if QUOTA_ERROR_DETECTED:
-            logging.warning("OpenAI quota previously exceeded. Halting further processing of files.")
-            break 
-
-        game_id = filename[:-5] 
-        file_path = os.path.join(input_dir, filename)
-        logging.info(f"--- Processing file: {filename} (Game ID: {game_id}) ---")
-        
-        current_file_plays_inserted = 0
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                l2m_json_content = json.load(f) 
-
-            if not l2m_json_content or "l2m" not in l2m_json_content:
-                logging.warning(f"File {filename} is empty, not valid JSON, or missing 'l2m' key. Skipping.")
-                continue 
-            
-            source_plays = l2m_json_content.get("l2m", [])
-            python_processed_plays = []
-            for play in source_plays:
-                # Python-based transformations
-                period_name = play.get("PeriodName", "Q4") # Default to Q4 if missing
-                period = 4 # Default
-                if "OT" in period_name:
-                    try:
-                        period = 4 + int(period_name.replace("OT", ""))
-                    except ValueError:
-                        logging.warning(f"Could not parse OT period: {period_name} for game {game_id}. Defaulting to 5 for OT.")
-                        period = 5 # Generic OT
-                
-                decision = play.get("CallRatingName")
-                is_correct = decision in ["CC", "CNC"] if decision else None
-
-                processed_play = {
-                    "period": period,
-                    "time": play.get("PCTime"),
-                    "call_type": play.get("CallType"),
-                    "decision": decision,
-                    "is_correct_decision": is_correct,
-                    "description": play.get("Comment"),
-                    # Pass original CP/DP for AI context, AI will use these to infer team favored/penalized
-                    "source_CP": play.get("CP"), 
-                    "source_DP": play.get("DP"),
-                    "source_posTeamId": play.get("posTeamId"), # Might also be useful context for AI
-                    # Initialize fields AI will populate
-                    "team_favored": None, 
-                    "team_penalized": None
-                }
-                python_processed_plays.append(processed_play)
-            
-            if not python_processed_plays:
-                logging.info(f"No plays to process after Python pre-processing for {game_id}.")
-                processed_files_count += 1
-                continue
-
-            # AI call to get team_favored and team_penalized
-            ai_augmented_plays = get_favored_penalized_teams_with_ai(python_processed_plays, game_id)
-            
-            officials = fetch_game_officials(game_id)
-
-            if ai_augmented_plays: # Check if AI returned anything (even if it's the original list on error)
-                try:
-                    delete_existing_plays(game_id) 
-                    current_file_plays_inserted = insert_plays_to_supabase(game_id, ai_augmented_plays, officials)
-                    total_plays_inserted_count += current_file_plays_inserted
-                except Exception as e: 
-                    logging.error(f"Failed to process Supabase operations for {game_id} due to: {e}. Skipping DB operations for this game.")
-            else:
-                logging.info(f"No plays returned from AI augmentation for {game_id}.")
-            
-            processed_files_count += 1 
-
-        except FileNotFoundError:
-            logging.error(f"File not found: {file_path}. Skipping.")
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to decode JSON from file {filename}: {e}. Skipping.")
-        except Exception as e:
-            logging.error(f"An unexpected error occurred while processing file {filename}: {e}")
+    processed_files_count, total_plays_inserted_count = asyncio.run(_process_all(files_to_process, input_dir, mode))
 
     logging.info(f"--- Processing complete ---")
     if QUOTA_ERROR_DETECTED:
@@ -392,6 +909,11 @@ def process_raw_reports(input_dir: str, test_mode_limit: int = 0):
     logging.info(f"Total plays inserted across all processed games: {total_plays_inserted_count}.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process saved L2M reports and insert the calls into Supabase.")
+    parser.add_argument("--mode", choices=["interactive", "batch"], default="interactive",
+                        help="'batch' uses the OpenAI Batch API (cheaper, up to 24h) for bulk historical runs")
+    args = parser.parse_args()
+
     input_directory = "1nba-bad-call-tracker/raw_reports_json" 
     limit_files = 10000000 
-    process_raw_reports(input_dir=input_directory, test_mode_limit=limit_files)
+    process_raw_reports(input_dir=input_directory, test_mode_limit=limit_files, mode=args.mode)